@@ -4,4 +4,6 @@ copy "%RECIPE_DIR%\app.ico" "%PREFIX%\Menu"
 
 "%SCRIPTS%\pip" install apscheduler cclib flask flask-sslify markdown gunicorn requests GitHub-Flask requests_oauthlib
 if %errorlevel% neq 0 exit /b %errorlevel%
+if "%PY_VER%"=="2.7" "%SCRIPTS%\pip" install scandir
+if %errorlevel% neq 0 exit /b %errorlevel%
 "%PYTHON%" setup.py install
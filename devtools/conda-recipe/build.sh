@@ -1,3 +1,4 @@
 #!/bin/bash
 pip install apscheduler 'cclib>=1.6' flask flask-sslify markdown gunicorn requests GitHub-Flask requests_oauthlib
+if [[ "$PY_VER" == "2.7" ]]; then pip install scandir; fi
 $PYTHON setup.py install
\ No newline at end of file
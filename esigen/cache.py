@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+On-disk cache of parsed and rendered reports.
+
+Re-uploading the same logfile (for example, after tweaking the report
+options in the web interface) would parse and render it again from
+scratch. `cached_report` stores the resulting `(ESIgenReport, report)`
+pair keyed by the SHA1 of the file contents, the rendering options and
+the ESIgen version, so identical requests skip both steps.
+
+Cached entries are pickles, so the cache directory must only be writable
+by the current user: `cached_report` creates it with mode 0700 and
+refuses to use a directory that is a symlink, belongs to someone else or
+is accessible by other users.
+"""
+
+from __future__ import division, print_function, absolute_import
+import os
+import stat
+import time
+import hashlib
+import logging
+import tempfile
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+from . import __version__
+from .core import ESIgenReport
+from .utils import scandir
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(path, **options):
+    """
+    SHA1 hex digest of the contents of `path`, the given options and the
+    ESIgen version (so entries pickled by other releases are never reused).
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    options['version'] = __version__
+    sha.update(repr(sorted(options.items())).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def cached_report(path, cache_dir, reporter=ESIgenReport, template='default.md',
+                  preview=None, process_markdown=False, missing=None):
+    """
+    Parse `path` and render it with `template`, reusing the result stored
+    in `cache_dir` by a previous identical call.
+
+    Static previews are never cached, since they render images next to
+    the logfile as a side effect. If `cache_dir` is not private to the
+    current user, the cache is bypassed altogether.
+
+    Returns
+    -------
+    molecule : ESIgenReport
+    report : str
+    """
+    if preview in ('static', 'static_server') or not _private_dir(cache_dir):
+        molecule = reporter(path, missing=missing)
+        return molecule, molecule.report(template=template, preview=preview,
+                                         process_markdown=process_markdown)
+
+    key = cache_key(path, basename=os.path.basename(path),
+                    reporter='{0.__module__}.{0.__name__}'.format(reporter),
+                    template=template, preview=preview,
+                    process_markdown=process_markdown, missing=missing)
+    cached = os.path.join(cache_dir, key + '.pickle')
+    try:
+        with open(cached, 'rb') as f:
+            molecule, report = pickle.load(f)
+    except Exception:  # missing, truncated or stale entry: treat as a miss
+        molecule = reporter(path, missing=missing)
+        report = molecule.report(template=template, preview=preview,
+                                 process_markdown=process_markdown)
+        _dump(cached, (molecule, report))
+    else:
+        molecule.path = path
+    return molecule, report
+
+
+def clean_cache(cache_dir, max_age=3600):
+    """
+    Remove cached reports not written in the last `max_age` seconds.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    now = time.time()
+    for entry in list(scandir(cache_dir)):
+        try:
+            if now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except OSError:  # removed concurrently
+            pass
+
+
+def _private_dir(path):
+    """
+    Create `path` with mode 0700 if needed and check that it can be trusted:
+    a real directory (not a symlink), owned by us and closed to others.
+    """
+    try:
+        os.makedirs(path, 0o700)
+    except OSError:  # already exists, or cannot be created; checked below
+        pass
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(st.st_mode):
+        logger.warning('Cache path %s is not a directory; cache disabled', path)
+        return False
+    if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        logger.warning('Cache directory %s is not private; cache disabled', path)
+        return False
+    return True
+
+
+def _dump(path, obj):
+    # Write to a unique temporary file and rename it, so concurrent workers
+    # never read a half-written pickle
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    except OSError:  # cache directory removed concurrently
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+    except (IOError, OSError, pickle.PicklingError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
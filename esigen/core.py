@@ -15,6 +15,7 @@ except ImportError:
     import __builtin__ as builtins
 import os
 import sys
+import threading
 from collections import defaultdict
 from textwrap import dedent
 from itertools import chain
@@ -25,7 +26,6 @@ from cclib.io.ccio import guess_filetype
 from cclib.io import CJSONWriter
 from cclib.parser.data import ccData
 from cclib.parser.utils import convertor
-from markdown import markdown
 from jinja2 import PackageLoader
 from jinja2.sandbox import SandboxedEnvironment as Environment
 from jinja2.meta import find_undeclared_variables
@@ -39,6 +39,50 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 __here__ = os.path.abspath(os.path.dirname(__file__))
 _lower = str.lower if sys.version_info.major == 3 else unicode.lower
 BUILTIN_TEMPLATES = sorted(os.listdir(os.path.join(__here__, 'templates')), key=_lower)
+# A single environment shared by all reports, so Jinja's template cache
+# survives across ESIgenReport instances. Per-report values (like `missing`)
+# are passed in the render context instead of as globals.
+JINJA_ENV = Environment(trim_blocks=True, lstrip_blocks=True,
+                        loader=PackageLoader('esigen', 'templates'))
+# Make sure we get a consistent spacing for later replacing
+JINJA_ENV.globals['viewer3d'] = '{{ viewer3d }}'
+JINJA_ENV.globals['convertor'] = convertor
+JINJA_ENV.globals['np'] = np
+JINJA_ENV.globals.update(builtins.__dict__)
+_BUILTIN_TEMPLATE_VARIABLES = {}
+MARKDOWN_EXTENSIONS = ['markdown.extensions.tables',
+                       'markdown.extensions.fenced_code',
+                       'markdown.extensions.nl2br',
+                       'markdown.extensions.sane_lists']
+_MARKDOWN = threading.local()
+
+
+def _builtin_template_variables(env, template):
+    """
+    Return the undeclared variables of a builtin template. Builtin templates
+    do not change at runtime, so their source is read and parsed only once.
+    """
+    try:
+        return _BUILTIN_TEMPLATE_VARIABLES[template]
+    except KeyError:
+        source = env.loader.get_source(env, template)[0]
+        variables = find_undeclared_variables(env.parse(source))
+        _BUILTIN_TEMPLATE_VARIABLES[template] = variables
+        return variables
+
+
+def _markdown_to_html(text):
+    """
+    Convert Markdown to HTML. Setting up the extensions is a sizeable part
+    of each conversion, so one `Markdown` instance is reused per thread
+    (instances are stateful and not thread-safe).
+    """
+    md = getattr(_MARKDOWN, 'instance', None)
+    if md is None:
+        from markdown import Markdown
+        md = _MARKDOWN.instance = Markdown(extensions=MARKDOWN_EXTENSIONS)
+    md.reset()
+    return md.convert(text)
 
 
 class ESIgenReport(object):
@@ -81,6 +125,7 @@ class ESIgenReport(object):
             raise ValueError('Path "{}" is not available'.format(path))
         self.path = path
         self._missing = missing
+        self._data_dict_cache = {}
         if parser is None:
             with open(self.path) as f:
                 guessed = guess_filetype(f)
@@ -97,14 +142,20 @@ class ESIgenReport(object):
         self.name = os.path.splitext(os.path.basename(path))[0]
         self.basename = os.path.basename(path)
         self.data = self.parse(*args, **kwargs)
-        self.jinja_env = Environment(trim_blocks=True, lstrip_blocks=True,
-                                     loader=PackageLoader('esigen', 'templates'))
-        # Make sure we get a consistent spacing for later replacing
-        self.jinja_env.globals['viewer3d'] = '{{ viewer3d }}'
-        self.jinja_env.globals['missing'] = missing
-        self.jinja_env.globals['convertor'] = convertor
-        self.jinja_env.globals['np'] = np
-        self.jinja_env.globals.update(builtins.__dict__)
+        self.jinja_env = JINJA_ENV
+
+    def __getstate__(self):
+        # Parser callables and the Jinja environment cannot be pickled, and
+        # are not needed once parsed; drop them so reports can be sent
+        # across processes
+        state = self.__dict__.copy()
+        state.pop('parser', None)
+        state.pop('jinja_env', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.jinja_env = JINJA_ENV
 
     def parse(self, *args, **kwargs):
         """
@@ -150,46 +201,51 @@ class ESIgenReport(object):
             preview to be generated: static, static_server, web or None.
         """
         static_preview = preview in ('static', 'static_server')
+        variables = ()
         if template in BUILTIN_TEMPLATES:
             t = self.jinja_env.get_template(template)
             if static_preview:
-                with open(t.filename) as f:
-                    ast = self.jinja_env.parse(f.read())
+                variables = _builtin_template_variables(self.jinja_env, template)
         else:
             if os.path.isfile(template):
                 with open(template) as f:
                     template = f.read()
             # Maybe it is not a file, but a Jinja string
             t = self.jinja_env.from_string(template)
-            if static_preview:
-                ast = self.jinja_env.parse(template)
+            # Only parse when `image` can possibly be used in the template
+            if static_preview and 'image' in template:
+                variables = find_undeclared_variables(self.jinja_env.parse(template))
         image = None
-        if self.data.has_coordinates and static_preview and 'image' in find_undeclared_variables(ast):
+        if self.data.has_coordinates and 'image' in variables:
             if preview == 'static':
                 image = self.render_with_pymol()
             elif preview == 'static_server':
                 image = os.path.basename(self.render_with_pymol_server())
 
         rendered = t.render(name=self.name, filepath=self.path, filename=os.path.basename(self.path),
-                            image=image, preview=preview, **self.data_as_dict())
+                            image=image, preview=preview, missing=self._missing,
+                            **self.data_as_dict())
         if process_markdown:
-            return markdown(rendered, extensions=['markdown.extensions.tables',
-                                                  'markdown.extensions.fenced_code',
-                                                  'markdown.extensions.nl2br',
-                                                  'markdown.extensions.sane_lists'])
+            return _markdown_to_html(rendered)
         return rendered
 
     def data_as_dict(self):
         """
         Collects all data fields as a dictionary suitable for Jinja rendering.
         Also, redefines None values as `self._missing`.
+
+        Parsed data does not change after `parse`, so the collected fields
+        are cached per `missing` value and a shallow copy is returned.
         """
-        d = {}
-        for k, v in self.data.as_dict().items():
-            if v is None:
-                v = self._missing
-            d[k] = v
-        return d
+        d = self._data_dict_cache.get(self._missing)
+        if d is None:
+            d = {}
+            for k, v in self.data.as_dict().items():
+                if v is None:
+                    v = self._missing
+                d[k] = v
+            self._data_dict_cache[self._missing] = d
+        return d.copy()
 
     def data_as_cjson(self):
         return CJSONWriter(self.data, terse=True).generate_repr()
\ No newline at end of file
@@ -19,7 +19,6 @@ from __future__ import division, print_function, absolute_import
 import os
 import logging
 import re
-from collections import defaultdict
 import numpy as np
 from cclib.io import CML
 from cclib.io.ccio import triggers as ccio_triggers
@@ -27,7 +26,17 @@ from cclib.parser import Gaussian as _cclib_Gaussian
 from cclib.parser.logfileparser import Logfile
 from cclib.parser.data import ccData_optdone_bool, Attribute
 from cclib.parser.utils import convertor
-from .utils import PERIODIC_TABLE
+from .utils import PERIODIC_TABLE, cached_property
+
+
+XYZ_LINE = '%-4s % 15.6f % 15.6f % 15.6f'
+# Fixed-column PDB ATOM/HETATM record; the constant fields are residue UNK 1,
+# occupancy 1.00 and B-factor 0.00 with no altloc, chain, icode or charge
+PDB_LINE = '%-6s%5d %s UNK     1    %8.3f%8.3f%8.3f  1.00  0.00          %2s  '
+PDB_ATOM_ELEMENTS = np.array(list('CHONPS'))
+PDB_CHUNKSIZE = 4096
+# Element symbols indexed by atomic number, for vectorized lookups
+ELEMENT_SYMBOLS = np.array([''] + list(PERIODIC_TABLE.element[1:]))
 
 
 class ccDataExtended(ccData_optdone_bool):
@@ -52,6 +61,12 @@ class ccDataExtended(ccData_optdone_bool):
 
     A new list, _properties, is necessary to collect the defined properties,
     separate from _attrlist to circumvent errors in .arrayify().
+
+    Instances are treated as immutable once parsed: the text blocks
+    `xyz_block` (alias `cartesians`) and `pdb_block` are computed on first
+    access and cached (see `esigen.utils.cached_property`). If `atomnos` or
+    `atomcoords` are modified afterwards, those blocks will be stale; delete
+    them from the instance `__dict__` to recompute.
     """
 
     _attributes = ccData_optdone_bool._attributes.copy()
@@ -95,7 +110,7 @@ class ccDataExtended(ccData_optdone_bool):
 
     @property
     def atoms(self):
-        return np.array([PERIODIC_TABLE.element[n] for n in self.atomnos])
+        return ELEMENT_SYMBOLS[self.atomnos]
 
     @property
     def coordinates(self):
@@ -119,52 +134,94 @@ class ccDataExtended(ccData_optdone_bool):
     @property
     def stoichiometry(self):
         from cclib.method import Nuclear
-        return Nuclear(self).stoichiometry()
+        # cclib >= 1.6 raises (not AttributeError) if these are missing
+        if self.has_coordinates and hasattr(self, 'charge'):
+            return Nuclear(self).stoichiometry()
 
     @property
     def has_coordinates(self):
         return hasattr(self, 'atomnos') and hasattr(self, 'atomcoords')
 
-    @property
+    @cached_property
     def xyz_block(self):
-        return '\n'.join(['{:4} {: 15.6f} {: 15.6f} {: 15.6f}'.format(a, *xyz)
-                          for (a, xyz) in zip(self.atoms, self.coordinates)])
+        return _xyz_block(self.atoms, self.coordinates)
     cartesians = xyz_block
 
     def xyz_from(self, n):
         try:
-            return '\n'.join(['{:4} {: 15.6f} {: 15.6f} {: 15.6f}'.format(a, *xyz)
-                              for (a, xyz) in zip(self.atoms, self.atomcoords[n])])
+            return _xyz_block(self.atoms, self.atomcoords[n])
         except IndexError:
             raise ValueError('N must be smaller than {}'.format(self.atomcoords.shape[0]))
 
-    @property
+    @cached_property
     def pdb_block(self):
-        s = ('{field:<6}{serial_number:>5d} '
-             '{atom_name:^4}{alt_loc_indicator:<1}{res_name:<3} '
-             '{chain_id:<1}{res_seq_number:>4d}{insert_code:<1}   '
-             '{x_coord: >8.3f}{y_coord: >8.3f}{z_coord: >8.3f}'
-             '{occupancy:>6.2f}{temp_factor:>6.2f}          '
-             '{element:>2}{charge:>2}')
-        default = {'alt_loc_indicator': '', 'res_name': 'UNK', 'chain_id': '',
-                   'res_seq_number': 1, 'insert_code': '', 'occupancy': 1.0,
-                   'temp_factor': 0.0, 'charge': ''}
-        pdb = ['TITLE unknown', 'MODEL 1']
-        counter = defaultdict(int)
-        for i, (element, (x, y, z)) in enumerate(zip(self.atoms, self.coordinates)):
-            field = 'ATOM' if element.upper() in 'CHONPS' else 'HETATM'
-            counter[element] += 1
-            pdb.append(s.format(field=field, serial_number=i + 1, element=element,
-                                atom_name='{}{}'.format(element, counter[element]),
-                                x_coord=x, y_coord=y, z_coord=z, **default))
-        pdb.append('ENDMDL\nEND\n')
-        return '\n'.join(pdb)
+        return ''.join(_pdb_chunks(self.atoms, self.coordinates))
+
+    def write_pdb(self, fileobj):
+        """
+        Write `pdb_block` to an open file object chunk by chunk, without
+        building the whole block in memory first (unless already cached).
+        """
+        if 'pdb_block' in self.__dict__:
+            fileobj.write(self.pdb_block)
+        else:
+            fileobj.writelines(_pdb_chunks(self.atoms, self.coordinates))
 
     @property
     def cml_block(self):
         return CML(self).generate_repr()
 
 
+def _xyz_block(atoms, coordinates):
+    """
+    Format atoms and their (N, 3) coordinates as XYZ lines, using a
+    single %-format pass over the whole block instead of one call per atom.
+    """
+    coordinates = np.asarray(coordinates, dtype=float)
+    n_atoms = len(atoms)
+    if not n_atoms:
+        return ''
+    fields = np.empty((n_atoms, 4), dtype=object)
+    fields[:, 0] = atoms
+    fields[:, 1:] = coordinates
+    return '\n'.join([XYZ_LINE] * n_atoms) % tuple(fields.ravel().tolist())
+
+
+def _pdb_chunks(atoms, coordinates, chunksize=PDB_CHUNKSIZE):
+    """
+    Lazily format atoms and their (N, 3) coordinates as a single-model PDB
+    block, yielding newline-terminated chunks of at most `chunksize` atoms.
+
+    Record types and per-element atom serials (C1, C2, H1...) are computed
+    with NumPy for all atoms at once and each chunk of rows is filled in a
+    single %-format pass.
+    """
+    atoms = np.asarray(atoms, dtype=str)
+    coordinates = np.asarray(coordinates, dtype=float)
+    n_atoms = atoms.shape[0]
+    yield 'TITLE unknown\nMODEL 1\n'
+    if n_atoms:
+        fields = np.where(np.isin(np.char.upper(atoms), PDB_ATOM_ELEMENTS), 'ATOM', 'HETATM')
+        # Running count of each element: position within its (stable) group
+        _, groups = np.unique(atoms, return_inverse=True)
+        groups = groups.ravel()
+        order = np.argsort(groups, kind='mergesort')
+        sorted_groups = groups[order]
+        counter = np.empty(n_atoms, dtype=int)
+        counter[order] = np.arange(n_atoms) - np.searchsorted(sorted_groups, sorted_groups) + 1
+        names = np.char.center(np.char.add(atoms, counter.astype(str)), 4)
+        for start in range(0, n_atoms, chunksize):
+            stop = min(start + chunksize, n_atoms)
+            rows = np.empty((stop - start, 7), dtype=object)
+            rows[:, 0] = fields[start:stop]
+            rows[:, 1] = np.arange(start + 1, stop + 1)
+            rows[:, 2] = names[start:stop]
+            rows[:, 3:6] = coordinates[start:stop]
+            rows[:, 6] = atoms[start:stop]
+            yield '\n'.join([PDB_LINE] * (stop - start)) % tuple(rows.ravel().tolist()) + '\n'
+    yield 'ENDMDL\nEND\n'
+
+
 class GaussianParser(_cclib_Gaussian):
 
     """
@@ -6,10 +6,38 @@ from __future__ import division, print_function
 import os
 from textwrap import dedent
 from cclib.parser.utils import convertor, PeriodicTable
+try:
+    from os import scandir
+except ImportError:  # Python 2.7
+    from scandir import scandir
 
 
 PERIODIC_TABLE = PeriodicTable()
 
+
+class cached_property(object):
+
+    """
+    Like `property`, but the value is computed only once per instance and
+    stored in its `__dict__` (`functools.cached_property` needs Python 3.8).
+    Aliases of the same descriptor share the cached value.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        name = self.func.__name__
+        try:
+            return obj.__dict__[name]
+        except KeyError:
+            value = obj.__dict__[name] = self.func(obj)
+            return value
+
+
 def new_filename(path):
     i = 0
     name, ext = os.path.splitext(path)
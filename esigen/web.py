@@ -12,12 +12,17 @@ Requires:
 
 from __future__ import unicode_literals, print_function, division, absolute_import
 import os
+import atexit
 import json
 import sys
 from uuid import uuid4
 import datetime
+import time
 import shutil
 import hashlib
+from functools import partial
+from multiprocessing import Pool
+from threading import Lock
 from textwrap import dedent
 from zipfile import ZipFile, ZIP_DEFLATED
 try:
@@ -34,6 +39,8 @@ from werkzeug.utils import secure_filename
 from requests_oauthlib import OAuth2Session
 from oauthlib.oauth2 import MobileApplicationClient, MissingCodeError
 from .core import ESIgenReport, BUILTIN_TEMPLATES
+from .cache import cached_report, clean_cache
+from .utils import scandir
 from ._webhooks import Figshare, Zenodo
 
 HAS_PYMOL = None
@@ -86,6 +93,12 @@ if ZENODO:
 
 
 UPLOADS = "/tmp"
+# Must be private to the app user (see esigen.cache). If it lives inside
+# UPLOADS, clean_uploads() prunes its entries but never removes it whole
+CACHE_DIR = os.path.abspath(os.environ.get('ESIGEN_CACHE_DIR',
+                                         os.path.join(UPLOADS, 'esigen-cache')))
+# Uploads (and files derived from them) are removed after this many seconds
+UPLOADS_MAX_AGE = 3600
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024
 app.jinja_env.globals['MAX_CONTENT_LENGTH'] = 50
 app.config['PRODUCTION'] = PRODUCTION
@@ -96,6 +109,13 @@ app.jinja_env.globals['GITHUB'] = GITHUB
 app.jinja_env.globals['FIGSHARE'] = FIGSHARE
 app.jinja_env.globals['HEROKU_RELEASE_VERSION'] = os.environ.get('HEROKU_RELEASE_VERSION', '')
 ALLOWED_EXTENSIONS = set(('.out', '.log', '.adfout', '.qfi'))
+# Worker processes per web process (gunicorn runs one pool per worker)
+PROCESSES = int(os.environ.get('ESIGEN_PROCESSES', 2))
+app.config['PROCESSES'] = PROCESSES
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = Lock()
+UPLOAD_BUFFER_SIZE = 1 << 20
 URL_KWARGS = dict(_external=True, _scheme='https') if PRODUCTION else {}
 VERIFY_KWARGS = {} if PRODUCTION else {'verify': False}
 
@@ -119,10 +139,8 @@ app.json_encoder = NumpyJSONEncoder
 @app.route("/")
 def index():
     message = str(request.args.get('message', ''))[:100]
-    uuid = str(uuid4())
-    while os.path.exists(os.path.join(UPLOADS, uuid)):
-        uuid = str(uuid4())
-    return render_template("index.html", uuid=uuid, message=message,
+    # A UUID4 collision is not a practical concern; no need to stat UPLOADS
+    return render_template("index.html", uuid=str(uuid4()), message=message,
                            allowed_extensions=ALLOWED_EXTENSIONS)
 
 
@@ -147,7 +165,7 @@ def upload():
     for upload in allowed_filename(*request.files.getlist("file")):
         filename = secure_filename(upload.filename).rsplit("/")[0]
         destination = os.path.join(target, filename)
-        upload.save(destination)
+        upload.save(destination, buffer_size=UPLOAD_BUFFER_SIZE)
 
     if is_ajax:
         return ajax_response(True, upload_key)
@@ -209,7 +227,6 @@ def report(uuid, template='default', css='github', missing='N/A',
     if not os.path.isdir(root):
         return redirect(url_for("index", message="Upload error. Try again", **URL_KWARGS))
 
-    reports, molecules = [], []
     html = engine == 'html'
     if html:
         preview = 'web'
@@ -218,28 +235,23 @@ def report(uuid, template='default', css='github', missing='N/A',
     else:
         preview = None
     missing = missing[:10] if missing is not None else None
+    paths = [entry.path for entry in sorted(scandir(root), key=lambda entry: entry.name)
+             if os.path.splitext(entry.name)[1] in ALLOWED_EXTENSIONS and entry.is_file()]
+    if not paths:
+        return redirect(url_for("index", message="File(s) could not be parsed!", **URL_KWARGS))
+    # Parsing is CPU-bound pure Python; spread several files across processes
+    process = partial(_process_upload, root=root, reporter=reporter, template=template,
+                      preview=preview, process_markdown=html, missing=missing)
+    if len(paths) > 1:
+        reports = _process_pool().map(process, paths, chunksize=1)
+    else:
+        reports = [process(paths[0])]
     json_dict = {}
     cjson_dict = {}
-    for fn in sorted(os.listdir(root)):
-        if os.path.splitext(fn)[1] not in ALLOWED_EXTENSIONS:
-            continue
-        path = os.path.join(root, fn)
-        molecule = reporter(path, missing=missing)
-        report = molecule.report(template=template, preview=preview, process_markdown=html)
-        reports.append((molecule, report))
+    for molecule, report in reports:
         json_dict[molecule.basename] = molecule.data_as_dict()
         cjson_dict[molecule.basename] = json.loads(molecule.data_as_cjson())
-        with open(os.path.join(root, molecule.name + '.md'), 'w') as f:
-            f.write(report)
-        if molecule.data.has_coordinates:
-            with open(os.path.join(root, molecule.name + '.pdb'), 'w') as f:
-                f.write(molecule.data.pdb_block)
-            with open(os.path.join(root, molecule.name + '.xyz'), 'w') as f:
-                f.write(molecule.data.xyz_block)
-            with open(os.path.join(root, molecule.name + '.cml'), 'w') as f:
-                f.write(molecule.data.cml_block)
-    if not reports:
-        return redirect(url_for("index", message="File(s) could not be parsed!", **URL_KWARGS))
+    molecule = reports[-1][0]
     with open(os.path.join(root, molecule.name + '.json'), 'w') as f:
         f.write(json.dumps(json_dict, cls=NumpyJSONEncoder))
     with open(os.path.join(root, molecule.name + '.cjson'), 'w') as f:
@@ -248,6 +260,53 @@ def report(uuid, template='default', css='github', missing='N/A',
     return EXPORT_ENGINES[engine](reports=reports, css=css, uuid=uuid, template=template, root=root)
 
 
+def _process_upload(path, root, reporter=ESIgenReport, template='default.md', preview=None,
+                    process_markdown=False, missing=None):
+    """
+    Parse and report a single uploaded file, writing the derived files
+    (.md, .pdb, .xyz, .cml) next to it. Runs in the worker processes of
+    `_process_pool`, so it must stay importable at module level.
+    """
+    molecule, report = cached_report(path, CACHE_DIR, reporter=reporter, template=template,
+                                     preview=preview, process_markdown=process_markdown,
+                                     missing=missing)
+    with open(os.path.join(root, molecule.name + '.md'), 'w') as f:
+        f.write(report)
+    if molecule.data.has_coordinates:
+        with open(os.path.join(root, molecule.name + '.pdb'), 'w') as f:
+            molecule.data.write_pdb(f)
+        with open(os.path.join(root, molecule.name + '.xyz'), 'w') as f:
+            f.write(molecule.data.xyz_block)
+        with open(os.path.join(root, molecule.name + '.cml'), 'w') as f:
+            f.write(molecule.data.cml_block)
+    return molecule, report
+
+
+def _process_pool():
+    """
+    Lazily create the process pool shared by all requests. It is not
+    started at import time so the app can be preloaded before forking.
+    """
+    global _POOL, _POOL_PID, _POOL_LOCK
+    if _POOL_PID != os.getpid():
+        # Forked since the pool was created (e.g. a gunicorn worker): the
+        # inherited pool has no live threads here and the lock may be held
+        _POOL, _POOL_PID, _POOL_LOCK = None, os.getpid(), Lock()
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = Pool(processes=app.config['PROCESSES'])
+            atexit.register(_close_pool, _POOL, os.getpid())
+    return _POOL
+
+
+def _close_pool(pool, pid):
+    # atexit handlers are inherited by forked children; only the creator
+    # process may close its pool
+    if pid == os.getpid():
+        pool.close()
+        pool.join()
+
+
 @app.route('/export/')
 @app.route('/export/<target>')
 @app.route('/export/<target>/<uuid>')
@@ -505,7 +564,11 @@ def privacy_policy():
 
 @app.route('/images/<path:filename>')
 def get_image(filename):
-    return send_from_directory(UPLOADS, filename, as_attachment=True)
+    # Uploads are private and short-lived: let the user's browser (but not
+    # shared proxies) keep them while they exist, revalidating afterwards
+    response = send_from_directory(UPLOADS, filename, conditional=True)
+    response.headers['Cache-Control'] = 'private, max-age={}'.format(UPLOADS_MAX_AGE)
+    return response
 
 
 @app.route('/logout')
@@ -519,17 +582,23 @@ def ajax_response(status, msg):
     return json.dumps(dict(status=status_code, msg=msg))
 
 
-def clean_uploads():
-    for uuid in os.listdir(UPLOADS):
-        path = os.path.join(UPLOADS, uuid)
-        delta = datetime.datetime.now() - _modification_date(path)
-        if delta > datetime.timedelta(hours=1):
-            shutil.rmtree(path)
-
-
-def _modification_date(filename):
-    t = os.path.getmtime(filename)
-    return datetime.datetime.fromtimestamp(t)
+def clean_uploads(max_age=UPLOADS_MAX_AGE):
+    clean_cache(CACHE_DIR, max_age=max_age)
+    now = time.time()
+    stale = []
+    # list() exhausts the iterator, which closes its directory handle
+    for entry in list(scandir(UPLOADS)):
+        try:
+            if (entry.is_dir(follow_symlinks=False)
+                    and os.path.abspath(entry.path) != CACHE_DIR
+                    and now - entry.stat().st_mtime > max_age):
+                stale.append(entry.path)
+        except OSError:  # removed concurrently
+            pass
+    # Runs on the scheduler thread (in the gunicorn master when preloaded):
+    # never touch the shared request pools from here
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
 
 
 def allowed_filename(*filenames):
@@ -545,6 +614,10 @@ def main():
         import logging
         logging.basicConfig(level=logging.DEBUG)
     ssl = {'ssl_context': ('cert.pem',)} if os.path.isfile('cert.pem') else {}
+    # Fork the workers before the threaded server starts its threads; with
+    # the reloader, only in the child process that actually serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN'):
+        _process_pool()
     app.run(debug=True, threaded=True, **ssl)
 
 
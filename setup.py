@@ -40,7 +40,8 @@ setup(
         'Operating System :: OS Independent',
         'Topic :: Scientific/Engineering :: Chemistry',
     ],
-    install_requires=['cclib', 'Flask', 'flask-sslify', 'GitHub-Flask', 'markdown', 'requests', 'requests_oauthlib'],
+    install_requires=['cclib', 'Flask', 'flask-sslify', 'GitHub-Flask', 'markdown', 'requests', 'requests_oauthlib',
+                      'scandir; python_version < "3.5"'],
                       #'sphinx', 'sphinx_rtd_theme'],
     entry_points='''
         [console_scripts]
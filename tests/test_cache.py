@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import os
+import shutil
+import pytest
+from esigen import ESIgenReport
+import esigen.cache
+from esigen.cache import cache_key, cached_report, clean_cache
+from conftest import datapath
+
+
+class CountingReport(ESIgenReport):
+
+    """Count instantiations, i.e. how many times a file was parsed."""
+
+    parsed = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingReport.parsed += 1
+        super(CountingReport, self).__init__(*args, **kwargs)
+
+
+@pytest.fixture
+def logfile(tmpdir):
+    path = str(tmpdir.join('opt_amber.log'))
+    shutil.copy(datapath('opt_amber.log'), path)
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    CountingReport.parsed = 0
+    return str(tmpdir.join('cache'))
+
+
+def test_cache_key(logfile, monkeypatch):
+    key = cache_key(logfile, template='default.md')
+    assert key == cache_key(logfile, template='default.md')
+    assert key != cache_key(logfile, template='TD.md')
+    assert key != cache_key(datapath('sp_232_exechanges_m06.out'), template='default.md')
+    monkeypatch.setattr(esigen.cache, '__version__', 'other')
+    assert key != cache_key(logfile, template='default.md')
+
+
+def test_cached_report_roundtrip(logfile, cache_dir):
+    molecule, report = cached_report(logfile, cache_dir, reporter=CountingReport)
+    assert CountingReport.parsed == 1
+    assert report == ESIgenReport(logfile).report()
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+    cached_molecule, cached = cached_report(logfile, cache_dir, reporter=CountingReport)
+    assert CountingReport.parsed == 1
+    assert cached == report
+    assert cached_molecule.path == logfile
+    assert cached_molecule.data_as_dict().keys() == molecule.data_as_dict().keys()
+    cached_report(logfile, cache_dir, reporter=CountingReport, template='TD.md')
+    assert CountingReport.parsed == 2
+
+
+def test_cached_report_static_preview_bypass(logfile, cache_dir):
+    for _ in range(2):
+        cached_report(logfile, cache_dir, reporter=CountingReport, preview='static')
+    assert CountingReport.parsed == 2
+    assert not os.path.exists(cache_dir) or not os.listdir(cache_dir)
+
+
+def test_cached_report_broken_entry_is_a_miss(logfile, cache_dir):
+    cached_report(logfile, cache_dir, reporter=CountingReport)
+    entry, = os.listdir(cache_dir)
+    with open(os.path.join(cache_dir, entry), 'wb') as f:
+        f.write(b'not a pickle')
+    molecule, report = cached_report(logfile, cache_dir, reporter=CountingReport)
+    assert CountingReport.parsed == 2
+    assert report == ESIgenReport(logfile).report()
+
+
+def test_cached_report_rejects_shared_dir(logfile, cache_dir):
+    os.mkdir(cache_dir)
+    os.chmod(cache_dir, 0o777)
+    for _ in range(2):
+        cached_report(logfile, cache_dir, reporter=CountingReport)
+    assert CountingReport.parsed == 2
+    assert not os.listdir(cache_dir)
+
+
+def test_cached_report_rejects_symlink(logfile, cache_dir, tmpdir):
+    target = str(tmpdir.mkdir('target'))
+    os.chmod(target, 0o700)
+    os.symlink(target, cache_dir)
+    cached_report(logfile, cache_dir, reporter=CountingReport)
+    assert not os.listdir(target)
+
+
+def test_clean_cache(logfile, cache_dir):
+    cached_report(logfile, cache_dir, reporter=CountingReport)
+    clean_cache(cache_dir, max_age=3600)
+    assert len(os.listdir(cache_dir)) == 1
+    clean_cache(cache_dir, max_age=-1)
+    assert not os.listdir(cache_dir)
+    clean_cache(os.path.join(cache_dir, 'missing'))
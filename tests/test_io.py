@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Stdlib
+from __future__ import division, print_function
+from collections import defaultdict
+import pytest
+import numpy as np
+import esigen.io
+from esigen.io import ccDataExtended, PDB_CHUNKSIZE
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+# The logs in tests/data (ChemShell) carry no coordinates, so the blocks
+# are checked on synthetic molecules
+def molecule(atomnos, nframes=1, seed=0):
+    coords = np.random.RandomState(seed).uniform(-99, 99, (nframes, len(atomnos), 3))
+    return ccDataExtended(attributes={'atomnos': np.array(atomnos, dtype=int),
+                                      'atomcoords': coords})
+
+
+def reference_pdb_block(atoms, coordinates):
+    """Per-atom formatter that `pdb_block` used to be, with exact CHONPS matching"""
+    s = ('{field:<6}{serial_number:>5d} '
+         '{atom_name:^4}{alt_loc_indicator:<1}{res_name:<3} '
+         '{chain_id:<1}{res_seq_number:>4d}{insert_code:<1}   '
+         '{x_coord: >8.3f}{y_coord: >8.3f}{z_coord: >8.3f}'
+         '{occupancy:>6.2f}{temp_factor:>6.2f}          '
+         '{element:>2}{charge:>2}')
+    default = {'alt_loc_indicator': '', 'res_name': 'UNK', 'chain_id': '',
+               'res_seq_number': 1, 'insert_code': '', 'occupancy': 1.0,
+               'temp_factor': 0.0, 'charge': ''}
+    pdb = ['TITLE unknown', 'MODEL 1']
+    counter = defaultdict(int)
+    for i, (element, (x, y, z)) in enumerate(zip(atoms, coordinates)):
+        field = 'ATOM' if element.upper() in ('C', 'H', 'O', 'N', 'P', 'S') else 'HETATM'
+        counter[element] += 1
+        pdb.append(s.format(field=field, serial_number=i + 1, element=element,
+                            atom_name='{}{}'.format(element, counter[element]),
+                            x_coord=x, y_coord=y, z_coord=z, **default))
+    pdb.append('ENDMDL\nEND\n')
+    return '\n'.join(pdb)
+
+
+def reference_xyz_block(atoms, coordinates):
+    """Per-atom formatter that `xyz_block` used to be"""
+    return '\n'.join(['{:4} {: 15.6f} {: 15.6f} {: 15.6f}'.format(a, *xyz)
+                      for (a, xyz) in zip(atoms, coordinates)])
+
+
+PDB_BLOCK = """\
+TITLE unknown
+MODEL 1
+ATOM      1  O1  UNK     1       0.000   0.000   0.117  1.00  0.00           O  
+ATOM      2  H1  UNK     1       0.000   0.757  -0.469  1.00  0.00           H  
+ATOM      3  H2  UNK     1       0.000  -0.757  -0.469  1.00  0.00           H  
+HETATM    4 Ho1  UNK     1      10.000  -2.500 100.000  1.00  0.00          Ho  
+HETATM    5 Np1  UNK     1     -10.125   0.000   5.000  1.00  0.00          Np  
+ENDMDL
+END
+"""
+
+
+def test_pdb_block_known_good():
+    data = ccDataExtended(attributes={
+        'atomnos': np.array([8, 1, 1, 67, 93]),
+        'atomcoords': np.array([[[0., 0., 0.117], [0., 0.757, -0.469], [0., -0.757, -0.469],
+                                 [10., -2.5, 100.], [-10.125, 0., 5.]]])})
+    assert data.pdb_block == PDB_BLOCK
+
+
+@pytest.mark.parametrize('atomnos', [
+    [],
+    [6],
+    [6, 1, 8, 7, 15, 16, 67, 93, 26, 17],
+    [6] * 1001 + [1] * 3,
+    [6, 1] * (PDB_CHUNKSIZE // 2) + [30],
+])
+def test_pdb_block_matches_reference(atomnos):
+    data = molecule(atomnos)
+    assert data.pdb_block == reference_pdb_block(data.atoms, data.coordinates)
+    f = StringIO()
+    data.write_pdb(f)
+    assert f.getvalue() == data.pdb_block
+
+
+def test_pdb_block_serials_past_999():
+    lines = molecule([6] * 1001).pdb_block.splitlines()
+    assert lines[2 + 999][12:17] == 'C1000'
+    assert lines[2 + 1000][12:17] == 'C1001'
+
+
+def test_pdb_block_chunk_boundary():
+    n_atoms = PDB_CHUNKSIZE + 1
+    lines = molecule([6] * n_atoms).pdb_block.splitlines()
+    assert len(lines) == n_atoms + 4
+    assert [int(line[6:11]) for line in lines[2:-2]] == list(range(1, n_atoms + 1))
+
+
+@pytest.mark.parametrize('atomnos', [[], [6], [6, 1, 8, 67, 93, 26, 17], [6] * 1001])
+def test_xyz_block_matches_reference(atomnos):
+    data = molecule(atomnos, nframes=3)
+    assert data.xyz_block == reference_xyz_block(data.atoms, data.atomcoords[-1])
+    assert data.cartesians == data.xyz_block
+    for n in range(3):
+        assert data.xyz_from(n) == reference_xyz_block(data.atoms, data.atomcoords[n])
+
+
+def test_xyz_block_empty():
+    data = molecule([])
+    assert data.xyz_block == ''
+    assert data.xyz_from(0) == ''
+
+
+def test_xyz_from_out_of_range():
+    with pytest.raises(ValueError):
+        molecule([6, 1], nframes=2).xyz_from(2)
+
+
+def test_blocks_are_cached():
+    data = molecule([6, 1, 8])
+    assert data.cartesians is data.xyz_block
+    assert data.xyz_block is data.xyz_block
+    assert data.pdb_block is data.pdb_block
+
+
+def test_write_pdb_uses_cached_block(monkeypatch):
+    data = molecule([6, 1, 8])
+    f = StringIO()
+    data.write_pdb(f)
+    assert 'pdb_block' not in data.__dict__
+    expected = data.pdb_block
+
+    def fail(*args, **kwargs):
+        raise AssertionError('pdb_block should not be recomputed')
+    monkeypatch.setattr(esigen.io, '_pdb_chunks', fail)
+    f = StringIO()
+    data.write_pdb(f)
+    assert f.getvalue() == expected